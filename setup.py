@@ -33,6 +33,7 @@ setup(
     packages=setuptools.find_packages(),
     package_data={module_name: [str(p.relative_to(module_dir)) for p in data_files]},
     install_requires=requirements,
+    extras_require={"onnx": ["onnxruntime==1.17.1"]},
     classifiers=[
         "Development Status :: 3 - Alpha",
         "Intended Audience :: Developers",
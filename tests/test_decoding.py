@@ -0,0 +1,17 @@
+"""Tests for greedy CTC decoding"""
+import torch
+
+from wyoming_giga_am_ctc.decoding import ctc_greedy_decode, vocabulary_array
+
+_BLANK = 3
+_VOCABULARY = vocabulary_array([" ", "а", "б"])
+
+
+def test_ctc_greedy_decode() -> None:
+    ids = torch.tensor([3, 1, 1, 3, 1, 2, 2, 0, 0, 3, 2, 3])
+    assert ctc_greedy_decode(ids, _BLANK, _VOCABULARY) == "ааб б"
+
+
+def test_ctc_greedy_decode_blank() -> None:
+    ids = torch.full((10,), _BLANK)
+    assert ctc_greedy_decode(ids, _BLANK, _VOCABULARY) == ""
@@ -0,0 +1,261 @@
+"""Tests for model downloads"""
+# pylint: disable=protected-access
+import hashlib
+import io
+from pathlib import Path
+from typing import List, Optional
+
+import pytest
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from wyoming_giga_am_ctc import __main__ as program
+
+_URL = "https://example.com/model.ckpt"
+_CONTENT = b"model weights"
+_ETAG = f'"{hashlib.md5(_CONTENT).hexdigest()}"'
+
+
+class _Response:
+    def __init__(self, content: bytes, headers: dict, status_code: int = 200) -> None:
+        self.headers = CaseInsensitiveDict(headers)
+        self.raw = io.BytesIO(content)
+        self.status_code = status_code
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error", response=None)
+
+    def __enter__(self) -> "_Response":
+        return self
+
+    def __exit__(self, *args) -> None:
+        pass
+
+
+class _Server:
+    """Stands in for requests.head/requests.get, recording GET requests."""
+
+    def __init__(
+        self,
+        monkeypatch: pytest.MonkeyPatch,
+        content: bytes = _CONTENT,
+        headers: Optional[dict] = None,
+        offline: bool = False,
+        head_status: int = 200,
+    ) -> None:
+        self.content = content
+        self.headers = {"ETag": _ETAG} if headers is None else headers
+        self.offline = offline
+        self.head_status = head_status
+        self.gets: List[str] = []
+        monkeypatch.setattr(program.requests, "head", self.head)
+        monkeypatch.setattr(program.requests, "get", self.get)
+
+    def head(self, url: str, **kwargs) -> _Response:
+        if self.offline:
+            raise requests.ConnectionError()
+
+        if self.head_status != 200:
+            return _Response(b"", {}, self.head_status)
+
+        return _Response(b"", self.headers)
+
+    def get(self, url: str, **kwargs) -> _Response:
+        if self.offline:
+            raise requests.ConnectionError()
+
+        self.gets.append(url)
+        return _Response(self.content, self.headers)
+
+
+def _etag_path(path: Path) -> Path:
+    return path.with_name(path.name + ".etag")
+
+
+def test_download(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    server = _Server(monkeypatch)
+    path = tmp_path / "model.ckpt"
+
+    program._download(_URL, path)
+
+    assert path.read_bytes() == _CONTENT
+    assert _etag_path(path).read_text(encoding="utf-8") == _ETAG
+    assert server.gets == [_URL]
+    assert not path.with_name(path.name + ".tmp").exists()
+
+
+def test_download_current(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    server = _Server(monkeypatch)
+    path = tmp_path / "model.ckpt"
+    path.write_bytes(_CONTENT)
+    _etag_path(path).write_text(_ETAG, encoding="utf-8")
+
+    program._download(_URL, path)
+
+    assert not server.gets
+
+
+def test_download_outdated(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    server = _Server(monkeypatch)
+    path = tmp_path / "model.ckpt"
+    path.write_bytes(b"old weights")
+    _etag_path(path).write_text('"old"', encoding="utf-8")
+
+    program._download(_URL, path)
+
+    assert server.gets == [_URL]
+    assert path.read_bytes() == _CONTENT
+    assert _etag_path(path).read_text(encoding="utf-8") == _ETAG
+
+
+def test_download_legacy_intact(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    server = _Server(monkeypatch)
+    path = tmp_path / "model.ckpt"
+    path.write_bytes(_CONTENT)
+
+    program._download(_URL, path)
+
+    assert not server.gets
+    assert _etag_path(path).read_text(encoding="utf-8") == _ETAG
+
+
+def test_download_legacy_corrupt(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    server = _Server(monkeypatch)
+    path = tmp_path / "model.ckpt"
+    path.write_bytes(_CONTENT[:-1])
+
+    program._download(_URL, path)
+
+    assert server.gets == [_URL]
+    assert path.read_bytes() == _CONTENT
+
+
+def test_download_legacy_no_digest(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # Multipart ETags are not an MD5 of the content, so the file is trusted
+    server = _Server(monkeypatch, headers={"ETag": '"abc-2"'})
+    path = tmp_path / "model.ckpt"
+    path.write_bytes(b"other weights")
+
+    program._download(_URL, path)
+
+    assert not server.gets
+    assert path.read_bytes() == b"other weights"
+
+
+def test_download_mismatch(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    _Server(monkeypatch, content=b"truncated")
+    path = tmp_path / "model.ckpt"
+
+    with pytest.raises(RuntimeError):
+        program._download(_URL, path)
+
+    assert not path.exists()
+    assert not path.with_name(path.name + ".tmp").exists()
+
+
+def test_download_mismatch_keeps_file(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    server = _Server(monkeypatch, content=b"truncated")
+    path = tmp_path / "model.ckpt"
+    path.write_bytes(b"old weights")
+    _etag_path(path).write_text('"old"', encoding="utf-8")
+
+    program._download(_URL, path)
+
+    assert server.gets == [_URL]
+    assert path.read_bytes() == b"old weights"
+    assert _etag_path(path).read_text(encoding="utf-8") == '"old"'
+
+
+def test_download_content_encoding(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # The ETag is the MD5 of the encoded object, not of the decoded body
+    _Server(
+        monkeypatch,
+        headers={"ETag": '"' + "0" * 32 + '"', "Content-Encoding": "gzip"},
+    )
+    path = tmp_path / "model.ckpt"
+
+    program._download(_URL, path)
+
+    assert path.read_bytes() == _CONTENT
+
+
+def test_download_sha256(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    _Server(
+        monkeypatch,
+        content=b"truncated",
+        headers={"x-amz-meta-sha256": hashlib.sha256(_CONTENT).hexdigest()},
+    )
+    path = tmp_path / "model.ckpt"
+
+    with pytest.raises(RuntimeError):
+        program._download(_URL, path)
+
+
+def test_download_no_etag(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    _Server(monkeypatch, headers={})
+    path = tmp_path / "model.ckpt"
+    path.write_bytes(b"old weights")
+    _etag_path(path).write_text('"old"', encoding="utf-8")
+
+    # An existing sidecar without a server ETag counts as current
+    program._download(_URL, path)
+    assert path.read_bytes() == b"old weights"
+
+    _etag_path(path).unlink()
+    path.unlink()
+    program._download(_URL, path)
+
+    assert path.read_bytes() == _CONTENT
+    assert not _etag_path(path).exists()
+
+
+def test_download_offline(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    _Server(monkeypatch, offline=True)
+    path = tmp_path / "model.ckpt"
+
+    with pytest.raises(requests.ConnectionError):
+        program._download(_URL, path)
+
+    path.write_bytes(b"old weights")
+    program._download(_URL, path)
+
+    assert path.read_bytes() == b"old weights"
+
+
+@pytest.mark.parametrize("status_code", [403, 405])
+def test_download_head_rejected(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, status_code: int
+) -> None:
+    # e.g. presigned S3 URLs, whose signature only covers GET
+    server = _Server(monkeypatch, head_status=status_code)
+    path = tmp_path / "model.ckpt"
+
+    program._download(_URL, path)
+
+    assert server.gets == [_URL]
+    assert path.read_bytes() == _CONTENT
+    assert _etag_path(path).read_text(encoding="utf-8") == _ETAG
+
+
+def test_download_head_rejected_keeps_file(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    server = _Server(monkeypatch, head_status=403)
+    path = tmp_path / "model.ckpt"
+    path.write_bytes(b"old weights")
+
+    program._download(_URL, path)
+
+    assert not server.gets
+    assert path.read_bytes() == b"old weights"
@@ -0,0 +1,124 @@
+"""Tests for batched transcription"""
+import asyncio
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from typing import AsyncIterator, List, Tuple
+
+import pytest
+import torch
+
+from wyoming_giga_am_ctc.transcriber import BatchTranscriber
+
+_VOCABULARY = [" ", "а", "б"]
+_BLANK = len(_VOCABULARY)
+
+
+class _Encoder:
+    """Passes features through, recording the size of each batch."""
+
+    def __init__(self) -> None:
+        self.batch_sizes: List[int] = []
+        self.error: Exception = RuntimeError("failed")
+        self.fail = False
+
+    def __call__(
+        self, audio_signal: torch.Tensor, length: torch.Tensor
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        self.batch_sizes.append(len(audio_signal))
+        if self.fail:
+            raise self.error
+
+        return audio_signal, length
+
+
+@asynccontextmanager
+async def _run_transcriber(
+    encoder: _Encoder, batch_window: float = 0.05, max_batch_size: int = 4
+) -> AsyncIterator[BatchTranscriber]:
+    # Samples are token ids; the decoder one-hot encodes them as log probs
+    model = SimpleNamespace(
+        device=torch.device("cpu"),
+        decoding=SimpleNamespace(vocabulary=_VOCABULARY, blank_id=_BLANK),
+        preprocessor=lambda input_signal, length: (input_signal.unsqueeze(1), length),
+        decoder=lambda encoder_output: torch.nn.functional.one_hot(
+            encoder_output.squeeze(1).long(), _BLANK + 1
+        ).float(),
+    )
+    transcriber = BatchTranscriber(
+        model, batch_window, max_batch_size, encoder=encoder  # type: ignore[arg-type]
+    )
+    transcriber.start()
+    try:
+        yield transcriber
+    finally:
+        await transcriber.stop()
+
+
+def _audio(*ids: int) -> torch.Tensor:
+    return torch.tensor(ids, dtype=torch.float32)
+
+
+@pytest.mark.asyncio
+async def test_batch() -> None:
+    encoder = _Encoder()
+    async with _run_transcriber(encoder) as transcriber:
+        texts = await asyncio.gather(
+            transcriber.transcribe(_audio(1, 3, 2)),
+            transcriber.transcribe(_audio(2, 2, 3, 2, 0, 1)),
+            transcriber.transcribe(_audio(3)),
+        )
+
+        assert texts == ["аб", "бб а", ""]
+        assert encoder.batch_sizes == [3]
+
+
+@pytest.mark.asyncio
+async def test_max_batch_size() -> None:
+    encoder = _Encoder()
+    async with _run_transcriber(encoder, max_batch_size=2) as transcriber:
+        texts = await asyncio.gather(
+            *(transcriber.transcribe(_audio(i % 3)) for i in range(5))
+        )
+
+        assert texts == [" ", "а", "б", " ", "а"]
+        assert encoder.batch_sizes == [2, 2, 1]
+
+
+@pytest.mark.asyncio
+async def test_batch_window() -> None:
+    encoder = _Encoder()
+    async with _run_transcriber(encoder, batch_window=0) as transcriber:
+        assert await transcriber.transcribe(_audio(1)) == "а"
+        assert await transcriber.transcribe(_audio(2)) == "б"
+        assert encoder.batch_sizes == [1, 1]
+
+
+@pytest.mark.asyncio
+async def test_skip_disconnected() -> None:
+    encoder = _Encoder()
+    async with _run_transcriber(encoder) as transcriber:
+        disconnected = asyncio.create_task(transcriber.transcribe(_audio(1)))
+        connected = asyncio.create_task(transcriber.transcribe(_audio(2)))
+        await asyncio.sleep(0)
+        disconnected.cancel()
+
+        assert await connected == "б"
+        assert encoder.batch_sizes == [1]
+
+
+@pytest.mark.asyncio
+async def test_error() -> None:
+    encoder = _Encoder()
+    encoder.fail = True
+    async with _run_transcriber(encoder) as transcriber:
+        results = await asyncio.gather(
+            transcriber.transcribe(_audio(1)),
+            transcriber.transcribe(_audio(2)),
+            return_exceptions=True,
+        )
+
+        assert results == [encoder.error, encoder.error]
+
+        # The batching task survives and serves later requests
+        encoder.fail = False
+        assert await transcriber.transcribe(_audio(1)) == "а"
@@ -0,0 +1,30 @@
+"""Tests for silence removal"""
+import numpy as np
+
+from wyoming_giga_am_ctc.vad import remove_silence
+
+_RATE = 16000
+
+
+def test_remove_silence() -> None:
+    silence = np.zeros(_RATE, dtype=np.float32)
+    speech = np.full(_RATE // 2, 0.1, dtype=np.float32)
+    audio = np.concatenate([silence, speech, silence])
+
+    trimmed = remove_silence(audio, _RATE, 40)
+
+    # Speech plus 100 ms of context on each side
+    assert len(trimmed) == len(speech) + 2 * (_RATE // 10)
+    assert np.count_nonzero(trimmed) == len(speech)
+
+
+def test_remove_silence_all_silent() -> None:
+    audio = np.zeros(_RATE, dtype=np.float32)
+    assert len(remove_silence(audio, _RATE, 40)) == 0
+
+
+def test_remove_silence_background_noise() -> None:
+    # About -70 dBFS; quiet enough to be dropped without any louder speech
+    rng = np.random.default_rng(0)
+    audio = rng.normal(0, 0.0003, _RATE).astype(np.float32)
+    assert len(remove_silence(audio, _RATE, 40)) == 0
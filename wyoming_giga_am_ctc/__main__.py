@@ -1,68 +1,139 @@
 #!/usr/bin/env python3
 import argparse
 import asyncio
+import hashlib
 import logging
 import os
+import re
+import shutil
 from functools import partial
 from pathlib import Path
+from typing import TYPE_CHECKING, Mapping, Optional, Tuple, cast
 
 import requests
-import torch
-import torchaudio
-from nemo.collections.asr.models import EncDecCTCModel
-from nemo.collections.asr.modules.audio_preprocessing import (
-    AudioToMelSpectrogramPreprocessor as NeMoAudioToMelSpectrogramPreprocessor,
-)
-from nemo.collections.asr.parts.preprocessing.features import (
-    FilterbankFeaturesTA as NeMoFilterbankFeaturesTA,
-)
 from wyoming.info import AsrModel, AsrProgram, Attribution, Info
 from wyoming.server import AsyncServer
 
 from . import __version__
-from .handler import GigaAMCTCEventHandler
+
+if TYPE_CHECKING:
+    import torch
 
 _LOGGER = logging.getLogger(__name__)
 logging.getLogger("nemo_logger").setLevel(logging.ERROR)
 
 
-class FilterbankFeaturesTA(NeMoFilterbankFeaturesTA):
-    def __init__(self, mel_scale: str = "htk", wkwargs=None, **kwargs):
-        if "window_size" in kwargs:
-            del kwargs["window_size"]
-        if "window_stride" in kwargs:
-            del kwargs["window_stride"]
-
-        super().__init__(**kwargs)
-
-        self._mel_spec_extractor = torchaudio.transforms.MelSpectrogram(
-            sample_rate=self._sample_rate,
-            win_length=self.win_length,
-            hop_length=self.hop_length,
-            n_mels=kwargs["nfilt"],
-            window_fn=self.torch_windows[kwargs["window"]],
-            mel_scale=mel_scale,
-            norm=kwargs["mel_norm"],
-            n_fft=kwargs["n_fft"],
-            f_max=kwargs.get("highfreq", None),
-            f_min=kwargs.get("lowfreq", 0),
-            wkwargs=wkwargs,
-        )
+def _expected_digest(headers: Mapping[str, str]) -> Optional[Tuple[str, str]]:
+    """Return the (algorithm, hex digest) the server advertises for a file."""
+    sha256 = headers.get("x-amz-meta-sha256")
+    if sha256:
+        return "sha256", sha256.lower()
 
+    # Single-part S3 uploads use the MD5 of the content as their ETag, but
+    # not when the body is re-encoded in transit or encrypted with SSE-KMS/C
+    if headers.get("Content-Encoding", "identity") != "identity":
+        return None
 
-class AudioToMelSpectrogramPreprocessor(
-    NeMoAudioToMelSpectrogramPreprocessor
-):  # pylint: disable=too-many-ancestors
-    def __init__(self, mel_scale: str = "htk", **kwargs):
-        super().__init__(**kwargs)
-        kwargs["nfilt"] = kwargs["features"]
-        del kwargs["features"]
-        self.featurizer = (
-            FilterbankFeaturesTA(  # Deprecated arguments; kept for config compatibility
-                mel_scale=mel_scale,
-                **kwargs,
-            )
-        )
+    if (headers.get("x-amz-server-side-encryption") == "aws:kms") or (
+        "x-amz-server-side-encryption-customer-algorithm" in headers
+    ):
+        return None
+
+    etag = headers.get("ETag", "").strip('"')
+    if re.fullmatch(r"[0-9a-f]{32}", etag):
+        return "md5", etag
+
+    return None
+
+
+def _file_matches(path: Path, digest: Tuple[str, str]) -> bool:
+    with open(path, "rb") as fd:
+        return hashlib.file_digest(fd, digest[0]).hexdigest() == digest[1]
+
+
+def _download(url: str, path: Path) -> None:
+    """Download url to path unless the local copy is current and intact."""
+    etag_path = path.with_name(path.name + ".etag")
+    tmp_path = path.with_name(path.name + ".tmp")
+    try:
+        r = requests.head(url, timeout=10, allow_redirects=True)
+        r.raise_for_status()
+    except requests.RequestException:
+        if path.is_file():
+            _LOGGER.warning("Failed to check %s for updates", url, exc_info=True)
+            return
+
+        # Some servers only allow GET (e.g. presigned S3 URLs), so
+        # still try to download; the GET response is checked on its own.
+        _LOGGER.debug("Failed to check %s", url, exc_info=True)
+
+    if path.is_file():
+        etag = r.headers.get("ETag")
+        if etag_path.is_file():
+            stored_etag = etag_path.read_text(encoding="utf-8").strip()
+            if (not etag) or (etag == stored_etag):
+                _LOGGER.debug("%s is up to date", path)
+                return
+        else:
+            # Downloaded before ETags were tracked; keep it only if intact
+            digest = _expected_digest(r.headers)
+            if (digest is None) or _file_matches(path, digest):
+                if etag:
+                    etag_path.write_text(etag, encoding="utf-8")
+
+                return
+
+        _LOGGER.info("%s is outdated or corrupt", path)
+
+    try:
+        with requests.get(url, stream=True, timeout=100) as r:
+            r.raise_for_status()
+            _LOGGER.debug("Loading %s", url)
+            r.raw.decode_content = True
+            with open(tmp_path, "wb") as fd:
+                shutil.copyfileobj(r.raw, fd, length=1024 * 1024)
+
+            etag = r.headers.get("ETag")
+            digest = _expected_digest(r.headers)
+    except requests.RequestException:
+        tmp_path.unlink(missing_ok=True)
+        if not path.is_file():
+            raise
+
+        _LOGGER.warning("Failed to download %s", url, exc_info=True)
+        return
+
+    if (digest is not None) and (not _file_matches(tmp_path, digest)):
+        tmp_path.unlink()
+        if not path.is_file():
+            raise RuntimeError(f"Checksum mismatch for {url}")
+
+        _LOGGER.warning("Checksum mismatch for %s; keeping %s", url, path)
+        return
+
+    os.replace(tmp_path, path)
+    if etag:
+        etag_path.write_text(etag, encoding="utf-8")
+    else:
+        etag_path.unlink(missing_ok=True)
+
+
+def _optimize_module(module: "torch.nn.Module", name: str) -> "torch.nn.Module":
+    """Script a module with TorchScript, falling back to torch.compile."""
+    import torch
+
+    try:
+        module = torch.jit.script(module)
+        _LOGGER.info("Scripted %s with TorchScript", name)
+        return module
+    except Exception:
+        _LOGGER.debug("Failed to script %s", name, exc_info=True)
+
+    _LOGGER.info("Compiling %s with torch.compile", name)
+    # Compiling a module returns an OptimizedModule, which is a Module
+    return cast(
+        "torch.nn.Module", torch.compile(module, backend="inductor", dynamic=True)
+    )
 
 
 async def main() -> None:
@@ -89,15 +160,53 @@ async def main() -> None:
         default="cpu",
         help="Device to use for inference (default: cpu)",
     )
+    parser.add_argument(
+        "--backend",
+        default="torch",
+        choices=["torch", "onnx", "faster"],
+        help=(
+            "Inference backend for the encoder (default: torch). "
+            "'faster' runs the encoder_converted.onnx that "
+            "python -m wyoming_giga_am_ctc.convert wrote into --data-dir"
+        ),
+    )
+    parser.add_argument(
+        "--jit",
+        action="store_true",
+        help="Script (or compile) the encoder and decoder for faster inference",
+    )
     # parser.add_argument(
     #     "--language",
     #     help="Default language to set for transcription",
     # )
-    # parser.add_argument(
-    #     "--compute-type",
-    #     default="default",
-    #     help="Compute type (float16, int8, etc.)",
-    # )
+    parser.add_argument(
+        "--cpu-threads",
+        type=int,
+        help="Number of threads for CPU inference (default: half of the CPUs)",
+    )
+    parser.add_argument(
+        "--batch-window-ms",
+        type=float,
+        default=10,
+        help="Time to wait for concurrent requests to batch together (default: 10)",
+    )
+    parser.add_argument(
+        "--max-batch-size",
+        type=int,
+        default=4,
+        help="Maximum number of requests per model call (default: 4)",
+    )
+    parser.add_argument(
+        "--silence-threshold-db",
+        type=float,
+        help="Skip 20 ms frames this many dB below the loudest one (e.g. 40)",
+    )
+    parser.add_argument(
+        "--compute-type",
+        default="default",
+        choices=["default", "int8", "bfloat16"],
+        help="Compute type (default, int8, bfloat16)",
+    )
     # parser.add_argument(
     #     "--beam-size",
     #     type=int,
@@ -120,11 +229,48 @@ async def main() -> None:
     )
     args = parser.parse_args()
 
+    if args.backend in ("onnx", "faster"):
+        if args.jit:
+            parser.error(f"--jit is not supported with --backend {args.backend}")
+
+        if args.compute_type == "bfloat16":
+            parser.error(
+                f"--compute-type bfloat16 is not supported with --backend {args.backend}"
+            )
+
+        if args.backend == "faster":
+            faster_encoder_path = Path(args.data_dir) / "encoder_converted.onnx"
+            if not faster_encoder_path.is_file():
+                parser.error(
+                    f"{faster_encoder_path} not found; create it with "
+                    "python -m wyoming_giga_am_ctc.convert"
+                )
+    elif (args.compute_type == "int8") and (args.device != "cpu"):
+        parser.error("--compute-type int8 is only supported with --device cpu")
+
     logging.basicConfig(
         level=logging.DEBUG if args.debug else logging.INFO, format=args.log_format
     )
     _LOGGER.debug(args)
 
+    # One thread per physical core; more only adds ramp-up cost to small GEMMs
+    cpu_threads = args.cpu_threads or max(1, (os.cpu_count() or 1) // 2)
+    os.environ.setdefault("OMP_NUM_THREADS", str(cpu_threads))
+    os.environ.setdefault("MKL_NUM_THREADS", str(cpu_threads))
+
+    # Heavy imports are deferred so --help and --version return immediately,
+    # and so the thread settings above are seen when torch initializes.
+    import torch
+
+    from .handler import GigaAMCTCEventHandler, encode_event
+    from .model import load_model
+    from .onnx_encoder import OnnxEncoder, export_encoder, quantize_encoder
+    from .transcriber import BatchTranscriber
+
+    torch.set_num_threads(cpu_threads)
+    torch.set_num_interop_threads(1)
+    _LOGGER.debug("Using %s CPU thread(s)", cpu_threads)
+
     wyoming_info = Info(
         asr=[
             AsrProgram(
@@ -155,38 +301,86 @@ async def main() -> None:
 
     # Load model
     model_weights = Path(args.data_dir) / "ctc_model_weights.ckpt"
-    if not os.path.isfile(model_weights):
-        _LOGGER.debug("Loading %s", args.model_weights_url)
-        r = requests.get(args.model_weights_url, timeout=100)
-        with open(model_weights, "wb") as fd:
-            for chunk in r.iter_content(chunk_size=1024):
-                fd.write(chunk)
+    _download(args.model_weights_url, model_weights)
 
     model_config = Path(args.data_dir) / "ctc_model.config.yaml"
-    if not os.path.isfile(model_config):
-        _LOGGER.debug("Loading %s", args.model_config_url)
-        r = requests.get(args.model_config_url, timeout=100)
-        with open(model_config, "wb") as fd:
-            for chunk in r.iter_content(chunk_size=1024):
-                fd.write(chunk)
+    _download(args.model_config_url, model_config)
+
+    model = load_model(model_config, model_weights, args.device)
+
+    encoder: Optional[OnnxEncoder] = None
+    if args.backend == "onnx":
+        encoder_path = Path(args.data_dir) / "encoder.onnx"
+        export_encoder(model, encoder_path, model_weights)
+        if args.compute_type == "int8":
+            quantized_path = Path(args.data_dir) / "encoder_int8.onnx"
+            quantize_encoder(encoder_path, quantized_path)
+            encoder_path = quantized_path
+
+        encoder = OnnxEncoder(encoder_path, args.device, cpu_threads)
+        _LOGGER.info("Using ONNX Runtime encoder from %s", encoder_path)
+    elif args.backend == "faster":
+        # The decoder still comes from the checkpoint, so an encoder converted
+        # from older weights would silently produce wrong transcripts.
+        if faster_encoder_path.stat().st_mtime < model_weights.stat().st_mtime:
+            raise RuntimeError(
+                f"{faster_encoder_path} is older than {model_weights}; "
+                "convert it again with python -m wyoming_giga_am_ctc.convert"
+            )
 
-    model = EncDecCTCModel.from_config_file(model_config)
+        # Converted ahead of time, so startup skips the export and quantization
+        encoder = OnnxEncoder(faster_encoder_path, args.device, cpu_threads)
+        _LOGGER.info("Using pre-converted encoder from %s", faster_encoder_path)
+    elif args.compute_type == "int8":
+        # Preprocessor stays in FP32 for STFT accuracy
+        if "fbgemm" in torch.backends.quantized.supported_engines:
+            torch.backends.quantized.engine = "fbgemm"
 
-    ckpt = torch.load(model_weights, map_location="cpu")
-    model.load_state_dict(ckpt, strict=False)
-    model = model.to(args.device)
-    model.eval()
+        model.encoder = torch.quantization.quantize_dynamic(
+            model.encoder, {torch.nn.Linear, torch.nn.LSTM}, dtype=torch.qint8
+        )
+        _LOGGER.info(
+            "Quantized encoder to int8 (engine: %s)",
+            torch.backends.quantized.engine,
+        )
+
+    if encoder is not None:
+        # Only the ONNX Runtime session runs the encoder from here on
+        model.encoder = None
+
+    compute_dtype = torch.float32
+    if args.compute_type == "bfloat16":
+        # Only worth it on CPUs with native BF16 (AVX512-BF16/AMX) or on GPUs
+        compute_dtype = torch.bfloat16
+        model.encoder = model.encoder.to(dtype=compute_dtype)
+        model.decoder = model.decoder.to(dtype=compute_dtype)
+        _LOGGER.info("Converted encoder and decoder to bfloat16")
+
+    if args.jit:
+        # Preprocessor stays eager; its STFT/mel code is already native
+        model.encoder = _optimize_module(model.encoder, "encoder")
+        model.decoder = _optimize_module(model.decoder, "decoder")
+
+    # Info never changes, so serialize it once for all Describe requests
+    wyoming_info_bytes = await encode_event(wyoming_info.event())
+
+    transcriber = BatchTranscriber(
+        model,
+        args.batch_window_ms / 1000,
+        args.max_batch_size,
+        compute_dtype,
+        encoder,
+    )
+    transcriber.start()
 
     server = AsyncServer.from_uri(args.uri)
     _LOGGER.info("Ready")
-    model_lock = asyncio.Lock()
     await server.run(
         partial(
             GigaAMCTCEventHandler,
-            wyoming_info,
+            wyoming_info_bytes,
             args,
-            model,
-            model_lock,
+            transcriber,
         )
     )
 
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Convert the GigaAM CTC encoder for the ``--backend faster`` server option.
+
+The encoder is exported to ONNX and, by default, dynamically quantized to
+INT8 for ONNX Runtime. The feature extractor and the CTC decoder stay in
+torch and are still loaded from the checkpoint at startup, so convert again
+whenever the weights change; the server refuses an encoder older than them.
+
+INT8 only pays off on CPUs with integer dot-product instructions (AVX512-VNNI
+or AVX-VNNI on x86, dot-product extensions on ARM). Without them, ONNX Runtime
+emulates the INT8 GEMMs and the result can be slower than FP32.
+
+    python -m wyoming_giga_am_ctc.convert \\
+        --config ctc_model.config.yaml \\
+        --input ctc_model_weights.ckpt \\
+        --output encoder_converted.onnx \\
+        --quantize dynamic
+"""
+import argparse
+import logging
+import tempfile
+from pathlib import Path
+
+_LOGGER = logging.getLogger(__name__)
+logging.getLogger("nemo_logger").setLevel(logging.ERROR)
+
+
+def main() -> None:
+    """Main entry point."""
+    parser = argparse.ArgumentParser(
+        description="Convert the GigaAM CTC encoder to ONNX for --backend faster",
+        epilog=(
+            "INT8 needs AVX512-VNNI/AVX-VNNI (x86) or dot-product (ARM) "
+            "instructions to be faster than FP32"
+        ),
+    )
+    parser.add_argument("--config", required=True, help="Path to model config (YAML)")
+    parser.add_argument("--input", required=True, help="Path to model weights")
+    parser.add_argument(
+        "--output",
+        required=True,
+        help="Path to write the encoder to (encoder_converted.onnx in --data-dir)",
+    )
+    parser.add_argument(
+        "--quantize",
+        default="dynamic",
+        choices=["dynamic", "none"],
+        help="Weight quantization to apply (default: dynamic)",
+    )
+    parser.add_argument("--debug", action="store_true", help="Log DEBUG messages")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO)
+    _LOGGER.debug(args)
+
+    from .model import load_model
+    from .onnx_encoder import export_encoder, quantize_encoder
+
+    weights_path = Path(args.input)
+    output_path = Path(args.output)
+    model = load_model(args.config, weights_path)
+
+    if args.quantize == "none":
+        export_encoder(model, output_path, weights_path, force=True)
+    else:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            encoder_path = Path(temp_dir) / "encoder.onnx"
+            export_encoder(model, encoder_path, weights_path)
+            quantize_encoder(encoder_path, output_path, force=True)
+
+    _LOGGER.info("Wrote %s", output_path)
+
+
+# -----------------------------------------------------------------------------
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+"""Greedy CTC decoding."""
+from typing import List
+
+import numpy as np
+import torch
+
+
+def vocabulary_array(vocabulary: List[str]) -> np.ndarray:
+    """Build a token id -> string lookup table, with the blank as last entry."""
+    return np.asarray(vocabulary + ["<blk>"], dtype=object)
+
+
+@torch.jit.script
+def ctc_collapse(ids: torch.Tensor, blank: int) -> torch.Tensor:
+    """Merge repeated tokens and drop blanks from greedy CTC predictions."""
+    ids = torch.unique_consecutive(ids)
+    return ids[ids != blank]
+
+
+def ctc_greedy_decode(ids: torch.Tensor, blank: int, vocabulary: np.ndarray) -> str:
+    """Decode per-frame argmax token ids of a single utterance to text."""
+    return "".join(vocabulary[ctc_collapse(ids, blank).numpy()].tolist())
@@ -2,65 +2,111 @@
 import argparse
 import asyncio
 import logging
-import os
-import tempfile
-import wave
-from typing import Optional
+from functools import lru_cache
+from typing import Iterable, Optional, cast
 
-from nemo.collections.asr.models import EncDecCTCModel
+import numpy as np
+import torch
+import torchaudio
 from wyoming.asr import Transcribe, Transcript
-from wyoming.audio import AudioChunk, AudioStop
-from wyoming.event import Event
-from wyoming.info import Describe, Info
+from wyoming.audio import AudioChunk, AudioChunkConverter, AudioStop
+from wyoming.event import Event, async_write_event
+from wyoming.info import Describe
 from wyoming.server import AsyncEventHandler
 
+from .transcriber import BatchTranscriber
+from .vad import remove_silence
+
 _LOGGER = logging.getLogger(__name__)
 
+_RATE = 16000
+
+# Initial capacity of the per-connection sample buffer, in model-rate samples
+_BUFFER_SECONDS = 10
+
+# Sample rates accepted from clients; others would need huge buffers/kernels
+_MIN_RATE = 8000
+_MAX_RATE = 192000
+
+
+@lru_cache(maxsize=8)
+def _get_resampler(orig_freq: int) -> torchaudio.transforms.Resample:
+    """Resampler to the model rate; cached so its kernel is built only once.
+
+    The rate comes from clients, so only a few recent ones are kept.
+    """
+    return torchaudio.transforms.Resample(orig_freq, _RATE)
+
+
+class _EventBuffer:
+    """Collects the bytes that async_write_event sends to a stream."""
+
+    def __init__(self) -> None:
+        self.data = bytearray()
+
+    def write(self, data: bytes) -> None:
+        self.data.extend(data)
+
+    def writelines(self, data: Iterable[bytes]) -> None:
+        for line in data:
+            self.data.extend(line)
+
+    async def drain(self) -> None:
+        pass
+
+
+async def encode_event(event: Event) -> bytes:
+    """Serialize an event to its wire format."""
+    buffer = _EventBuffer()
+    await async_write_event(event, cast(asyncio.StreamWriter, buffer))
+    return bytes(buffer.data)
+
 
 class GigaAMCTCEventHandler(AsyncEventHandler):
     """Event handler for clients."""
 
     def __init__(
         self,
-        wyoming_info: Info,
+        wyoming_info_bytes: bytes,
         cli_args: argparse.Namespace,
-        model: EncDecCTCModel,
-        model_lock: asyncio.Lock,
+        transcriber: BatchTranscriber,
         *args,
         **kwargs,
     ) -> None:
         super().__init__(*args, **kwargs)
 
         self.cli_args = cli_args
-        self.wyoming_info_event = wyoming_info.event()
-        self.model = model
-        self.model_lock = model_lock
-        self._wav_dir = tempfile.TemporaryDirectory()
-        self._wav_path = os.path.join(self._wav_dir.name, "speech.wav")
-        self._wav_file: Optional[wave.Wave_write] = None
+        self.wyoming_info_bytes = wyoming_info_bytes
+        self.transcriber = transcriber
+        self._audio_converter = AudioChunkConverter(width=2, channels=1)
+        self._audio = np.empty(0, dtype=np.float32)
+        self._num_samples = 0
+        self._rate: Optional[int] = None
 
     async def handle_event(self, event: Event) -> bool:
         if AudioChunk.is_type(event.type):
-            chunk = AudioChunk.from_event(event)
+            chunk = self._audio_converter.convert(AudioChunk.from_event(event))
+            if not _MIN_RATE <= chunk.rate <= _MAX_RATE:
+                _LOGGER.warning("Unsupported sample rate: %s", chunk.rate)
+                return False
 
-            if self._wav_file is None:
-                self._wav_file = wave.open(self._wav_path, "wb")
-                self._wav_file.setframerate(chunk.rate)
-                self._wav_file.setsampwidth(chunk.width)
-                self._wav_file.setnchannels(chunk.channels)
-
-            self._wav_file.writeframes(chunk.audio)
+            self._rate = chunk.rate
+            self._append_audio(chunk.audio)
             return True
 
         if AudioStop.is_type(event.type):
             _LOGGER.debug("Audio stopped. Transcribing...")
-            assert self._wav_file is not None
+            assert self._rate is not None
 
-            self._wav_file.close()
-            self._wav_file = None
+            # Resampling and silence removal are CPU-bound too; keep them off
+            # the event loop along with the model.
+            audio = await self.transcriber.run_in_executor(
+                self._prepare_audio, self._audio[: self._num_samples], self._rate
+            )
 
-            async with self.model_lock:
-                transcription = self.model.transcribe([self._wav_path])[0]
+            transcription = ""
+            if len(audio) > 0:
+                transcription = await self.transcriber.transcribe(audio)
 
             _LOGGER.info(transcription)
 
@@ -68,6 +114,8 @@ class GigaAMCTCEventHandler(AsyncEventHandler):
             _LOGGER.debug("Completed request")
 
             # Reset
+            self._num_samples = 0
+            self._rate = None
             return False
 
         if Transcribe.is_type(event.type):
@@ -75,8 +123,39 @@ class GigaAMCTCEventHandler(AsyncEventHandler):
             return True
 
         if Describe.is_type(event.type):
-            await self.write_event(self.wyoming_info_event)
+            self.writer.write(self.wyoming_info_bytes)
+            await self.writer.drain()
             _LOGGER.debug("Sent info")
             return True
 
         return True
+
+    def _prepare_audio(self, samples: np.ndarray, rate: int) -> torch.Tensor:
+        """Convert buffered samples to the model rate, without silence."""
+        audio = torch.from_numpy(samples)
+        if rate != _RATE:
+            audio = _get_resampler(rate)(audio)
+
+        if self.cli_args.silence_threshold_db is not None:
+            audio = torch.from_numpy(
+                remove_silence(audio.numpy(), _RATE, self.cli_args.silence_threshold_db)
+            )
+
+        return audio
+
+    def _append_audio(self, audio_bytes: bytes) -> None:
+        """Decode 16-bit samples directly into the preallocated float buffer."""
+        samples = np.frombuffer(audio_bytes, dtype=np.int16)
+        end = self._num_samples + len(samples)
+        if end > len(self._audio):
+            # Grow geometrically so long utterances are copied O(log n) times
+            capacity = max(end, 2 * len(self._audio), _BUFFER_SECONDS * _RATE)
+            audio = np.empty(capacity, dtype=np.float32)
+            audio[: self._num_samples] = self._audio[: self._num_samples]
+            self._audio = audio
+
+        # Decode samples as they arrive so only the model runs after AudioStop
+        np.divide(
+            samples, 32768.0, out=self._audio[self._num_samples : end], dtype=np.float32
+        )
+        self._num_samples = end
@@ -0,0 +1,106 @@
+"""Construction of the GigaAM CTC model from its config and checkpoint."""
+import sys
+from pathlib import Path
+from typing import Union
+
+import torch
+import torchaudio
+from nemo.collections.asr.models import EncDecCTCModel
+from nemo.collections.asr.modules.audio_preprocessing import (
+    AudioToMelSpectrogramPreprocessor as NeMoAudioToMelSpectrogramPreprocessor,
+)
+from nemo.collections.asr.parts.preprocessing.features import (
+    FilterbankFeaturesTA as NeMoFilterbankFeaturesTA,
+)
+
+
+class FilterbankFeaturesTA(NeMoFilterbankFeaturesTA):
+    def __init__(self, mel_scale: str = "htk", wkwargs=None, **kwargs):
+        if "window_size" in kwargs:
+            del kwargs["window_size"]
+        if "window_stride" in kwargs:
+            del kwargs["window_stride"]
+
+        super().__init__(**kwargs)
+
+        self._mel_spec_extractor = torchaudio.transforms.MelSpectrogram(
+            sample_rate=self._sample_rate,
+            win_length=self.win_length,
+            hop_length=self.hop_length,
+            n_mels=kwargs["nfilt"],
+            window_fn=self.torch_windows[kwargs["window"]],
+            mel_scale=mel_scale,
+            norm=kwargs["mel_norm"],
+            n_fft=kwargs["n_fft"],
+            f_max=kwargs.get("highfreq", None),
+            f_min=kwargs.get("lowfreq", 0),
+            wkwargs=wkwargs,
+        )
+        self._mel_buffer = torch.empty(0)
+
+    def _extract_spectrograms(self, signals: torch.Tensor) -> torch.Tensor:
+        if self.training or (not torch.is_inference_mode_enabled()):
+            return super()._extract_spectrograms(signals)
+
+        # Write the mel projection into a reused buffer instead of a fresh
+        # (B, T, n_mels) tensor per call. Later steps (log, normalization)
+        # allocate their own outputs, so the buffer never escapes forward().
+        with torch.cuda.amp.autocast(enabled=False):
+            specgram = self._mel_spec_extractor.spectrogram(signals)
+            filter_banks = self._mel_spec_extractor.mel_scale.fb
+            batch_size, _, num_frames = specgram.shape
+            size = batch_size * num_frames * filter_banks.shape[1]
+            if (
+                (self._mel_buffer.numel() < size)
+                or (self._mel_buffer.device != specgram.device)
+                or (self._mel_buffer.dtype != specgram.dtype)
+            ):
+                self._mel_buffer = torch.empty(
+                    size, device=specgram.device, dtype=specgram.dtype
+                )
+
+            features = self._mel_buffer[:size].view(batch_size, num_frames, -1)
+            torch.matmul(specgram.transpose(-1, -2), filter_banks, out=features)
+
+        return features.transpose(-1, -2)
+
+
+class AudioToMelSpectrogramPreprocessor(
+    NeMoAudioToMelSpectrogramPreprocessor
+):  # pylint: disable=too-many-ancestors
+    def __init__(self, mel_scale: str = "htk", **kwargs):
+        super().__init__(**kwargs)
+        kwargs["nfilt"] = kwargs["features"]
+        del kwargs["features"]
+        # Deprecated arguments; kept for config compatibility
+        self.featurizer = FilterbankFeaturesTA(
+            mel_scale=mel_scale,
+            **kwargs,
+        )
+
+
+def load_model(
+    config_path: Union[str, Path],
+    weights_path: Union[str, Path],
+    device: str = "cpu",
+) -> EncDecCTCModel:
+    """Build the model in inference mode from its config and weights."""
+    # The config refers to the preprocessor classes by their __main__ path,
+    # as in the GigaAM example script; make that resolve for any entry point.
+    main_module = sys.modules["__main__"]
+    for cls in (FilterbankFeaturesTA, AudioToMelSpectrogramPreprocessor):
+        setattr(main_module, cls.__name__, cls)
+
+    model = EncDecCTCModel.from_config_file(str(config_path))
+
+    ckpt = torch.load(weights_path, map_location="cpu")
+    model.load_state_dict(ckpt, strict=False)
+    model = model.to(device)
+    model.eval()
+
+    # Audio is fed straight to forward(), so apply the inference-time
+    # featurizer settings that transcribe() would otherwise set per call.
+    model.preprocessor.featurizer.dither = 0.0
+    model.preprocessor.featurizer.pad_to = 0
+
+    return model
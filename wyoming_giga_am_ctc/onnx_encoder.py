@@ -0,0 +1,81 @@
+"""ONNX Runtime backend for the Conformer encoder."""
+import logging
+from pathlib import Path
+from typing import Tuple
+
+import torch
+from nemo.collections.asr.models import EncDecCTCModel
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def export_encoder(
+    model: EncDecCTCModel, path: Path, weights_path: Path, force: bool = False
+) -> None:
+    """Export the encoder to ONNX unless an export newer than the weights exists."""
+    if (
+        (not force)
+        and path.is_file()
+        and (path.stat().st_mtime >= weights_path.stat().st_mtime)
+    ):
+        return
+
+    _LOGGER.info("Exporting encoder to %s", path)
+    # NeMo picks the export format from the file extension
+    tmp_path = path.with_suffix(".tmp" + path.suffix)
+    model.encoder.export(str(tmp_path))
+    tmp_path.replace(path)
+
+
+def quantize_encoder(path: Path, quantized_path: Path, force: bool = False) -> None:
+    """Quantize an exported encoder to INT8 unless it was already done."""
+    if (
+        (not force)
+        and quantized_path.is_file()
+        and (quantized_path.stat().st_mtime >= path.stat().st_mtime)
+    ):
+        return
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    _LOGGER.info("Quantizing encoder to %s", quantized_path)
+    tmp_path = quantized_path.with_suffix(".tmp" + quantized_path.suffix)
+    quantize_dynamic(str(path), str(tmp_path), weight_type=QuantType.QInt8)
+    tmp_path.replace(quantized_path)
+
+
+class OnnxEncoder:
+    """Runs an exported encoder with the same call signature as NeMo's."""
+
+    def __init__(self, path: Path, device: str, num_threads: int) -> None:
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = (
+            onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        )
+        options.intra_op_num_threads = num_threads
+
+        providers = ["CPUExecutionProvider"]
+        if device.startswith("cuda"):
+            providers.insert(0, "CUDAExecutionProvider")
+
+        self.session = onnxruntime.InferenceSession(
+            str(path), sess_options=options, providers=providers
+        )
+        _LOGGER.debug("ONNX Runtime providers: %s", self.session.get_providers())
+
+    def __call__(
+        self, audio_signal: torch.Tensor, length: torch.Tensor
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        encoded, encoded_len = self.session.run(
+            ["outputs", "encoded_lengths"],
+            {
+                "audio_signal": audio_signal.cpu().numpy(),
+                "length": length.cpu().numpy(),
+            },
+        )
+        return (
+            torch.from_numpy(encoded).to(audio_signal.device),
+            torch.from_numpy(encoded_len).to(audio_signal.device),
+        )
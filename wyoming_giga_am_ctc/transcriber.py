@@ -0,0 +1,165 @@
+"""Batched transcription shared by all clients of the server."""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable, List, Optional, Tuple, TypeVar
+
+import torch
+
+from .decoding import ctc_greedy_decode, vocabulary_array
+
+if TYPE_CHECKING:
+    from nemo.collections.asr.models import EncDecCTCModel
+
+_LOGGER = logging.getLogger(__name__)
+
+Encoder = Callable[..., Tuple[torch.Tensor, torch.Tensor]]
+
+_T = TypeVar("_T")
+
+
+class BatchTranscriber:
+    """Coalesces concurrent requests into a single model forward pass."""
+
+    def __init__(
+        self,
+        model: "EncDecCTCModel",
+        batch_window: float,
+        max_batch_size: int,
+        compute_dtype: torch.dtype = torch.float32,
+        encoder: Optional[Encoder] = None,
+    ) -> None:
+        self.model = model
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.compute_dtype = compute_dtype
+        self.encoder: Encoder = encoder if encoder is not None else model.encoder
+        self.vocabulary = vocabulary_array(list(model.decoding.vocabulary))
+        self.blank: int = model.decoding.blank_id
+
+        # Padded input batches are assembled in a reused (pinned on CUDA)
+        # host buffer so the device copy can be asynchronous.
+        self._pin_memory = model.device.type == "cuda"
+        self._signal_buffer = torch.empty(0, pin_memory=self._pin_memory)
+
+        self._queue: "asyncio.Queue[Tuple[torch.Tensor, asyncio.Future[str]]]" = (
+            asyncio.Queue()
+        )
+        self._task: Optional[asyncio.Task] = None
+
+        # Keep inference on one dedicated thread so the event loop stays free
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="transcriber"
+        )
+
+    def start(self) -> None:
+        """Start the background batching task."""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background batching task and its inference thread."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+            self._task = None
+
+        self._executor.shutdown(wait=True)
+
+    async def transcribe(self, audio: torch.Tensor) -> str:
+        """Transcribe a mono 16 kHz float waveform."""
+        future: "asyncio.Future[str]" = asyncio.get_running_loop().create_future()
+        await self._queue.put((audio, future))
+        return await future
+
+    async def run_in_executor(self, func: Callable[..., _T], *args: Any) -> _T:
+        """Run other CPU-bound work on the inference thread."""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, func, *args
+        )
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+
+            # Wait a little for other clients to finish speaking
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Skip requests whose clients have already disconnected
+            batch = [(audio, future) for audio, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            _LOGGER.debug("Transcribing batch of %s", len(batch))
+            try:
+                texts = await loop.run_in_executor(
+                    self._executor,
+                    self._transcribe_batch,
+                    [audio for audio, _ in batch],
+                )
+            except Exception as err:
+                _LOGGER.exception("Unexpected error during transcription")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(err)
+                continue
+
+            for (_, future), text in zip(batch, texts):
+                if not future.done():
+                    future.set_result(text)
+
+    def _transcribe_batch(self, audios: List[torch.Tensor]) -> List[str]:
+        """Run the model on a batch of waveforms, padded to the longest."""
+        device = self.model.device
+        input_signal_length = torch.tensor([len(audio) for audio in audios])
+        max_length = int(input_signal_length.max())
+        size = len(audios) * max_length
+        if self._signal_buffer.numel() < size:
+            self._signal_buffer = torch.empty(size, pin_memory=self._pin_memory)
+
+        # Safe to reuse: the previous batch's copy finished when its ids
+        # were brought back to the CPU.
+        input_signal = self._signal_buffer[:size].view(len(audios), max_length)
+        for i, audio in enumerate(audios):
+            input_signal[i, : len(audio)] = audio
+            input_signal[i, len(audio) :] = 0
+
+        # Grad mode is thread-local, so this must run on the executor thread
+        with torch.inference_mode():
+            # Features are always computed in FP32; STFT magnitudes need it
+            processed_signal, processed_signal_length = self.model.preprocessor(
+                input_signal=input_signal.to(device, non_blocking=True),
+                length=input_signal_length.to(device, non_blocking=True),
+            )
+
+            with torch.autocast(
+                device_type=device.type,
+                dtype=self.compute_dtype,
+                enabled=self.compute_dtype != torch.float32,
+            ):
+                encoder_output = self.encoder(
+                    audio_signal=processed_signal.to(self.compute_dtype),
+                    length=processed_signal_length,
+                )
+                encoded_len = encoder_output[1]
+                log_probs = self.model.decoder(encoder_output=encoder_output[0])
+
+            ids = log_probs.argmax(dim=-1).cpu()
+
+        return [
+            ctc_greedy_decode(ids[i, :length], self.blank, self.vocabulary)
+            for i, length in enumerate(encoded_len.tolist())
+        ]
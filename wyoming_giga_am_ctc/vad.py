@@ -0,0 +1,34 @@
+"""Energy-based removal of silence before transcription."""
+import numpy as np
+
+_FRAME_MS = 20
+_PADDING_MS = 100
+
+# Frames quieter than this are dropped even in clips without any speech
+_FLOOR_DBFS = -60
+
+
+def remove_silence(audio: np.ndarray, rate: int, threshold_db: float) -> np.ndarray:
+    """Drop frames more than threshold_db below the loudest one, keeping context.
+
+    Frames below an absolute floor of -60 dBFS are always dropped, so a clip of
+    background noise alone is removed instead of being kept relative to itself.
+    """
+    if len(audio) == 0:
+        return audio
+
+    frame_size = rate * _FRAME_MS // 1000
+    starts = np.arange(0, len(audio), frame_size)
+    frame_lengths = np.diff(np.append(starts, len(audio)))
+    power = np.add.reduceat(audio * audio, starts) / frame_lengths
+
+    # Relative to the peak, since input levels vary a lot between microphones
+    voiced = power > (power.max() * (10 ** (-threshold_db / 10)))
+    voiced &= power > 10 ** (_FLOOR_DBFS / 10)
+
+    # Keep a guard band around speech so word onsets and endings survive
+    padding = _PADDING_MS // _FRAME_MS
+    voiced = np.convolve(voiced, np.ones(2 * padding + 1), mode="full")
+    voiced = voiced[padding : padding + len(frame_lengths)] > 0
+
+    return audio[np.repeat(voiced, frame_lengths)]